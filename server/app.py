@@ -1,11 +1,17 @@
 from __future__ import annotations
 
+import asyncio
 import os
 import socket
-from typing import Any, Dict, Optional
+import struct
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Dict, Optional, Tuple
 
-from fastapi import FastAPI, File, HTTPException, UploadFile
+import numpy as np
+from fastapi import FastAPI, File, HTTPException, Request, Response, UploadFile, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 
 from server.service_sam2 import (
     DEFAULT_MODEL_KEY,
@@ -33,8 +39,17 @@ if _cors:
     )
 
 
+# Dedicated pool for image embedding / mask prediction so heavy inference doesn't
+# starve FastAPI's default threadpool (used by the lightweight sync routes).
+# Per-session locks in SessionManager still serialize work on the same predictor.
+INFER_EXECUTOR = ThreadPoolExecutor(
+    max_workers=max(1, int(os.environ.get("SAM2_INFER_WORKERS", "2"))),
+    thread_name_prefix="sam2-infer",
+)
+
 model_mgr = ModelManager()
-session_mgr = SessionManager(model_mgr=model_mgr)
+# Predicts are queued on the event loop and run in batches on INFER_EXECUTOR.
+session_mgr = SessionManager(model_mgr=model_mgr, executor=INFER_EXECUTOR)
 
 
 @app.on_event("startup")
@@ -60,6 +75,11 @@ def _startup() -> None:
         pass  # Network unavailable, skip hint
 
 
+@app.on_event("shutdown")
+def _shutdown() -> None:
+    INFER_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+
+
 @app.get("/health")
 def health() -> Dict[str, Any]:
     info = model_mgr.info()
@@ -79,15 +99,22 @@ def models() -> Dict[str, Any]:
     }
 
 
+def _switch_model(key: str) -> None:
+    changed = key != model_mgr.info().model_key
+    model_mgr.load(key)
+    if changed:
+        # Changing the global model invalidates any session predictors/features. Only
+        # after a successful load: a failed one leaves the previous model serving them.
+        session_mgr.clear()
+
+
 @app.post("/model/select")
 def select_model(payload: Dict[str, Any]) -> Dict[str, Any]:
     key = payload.get("model_key")
     if not isinstance(key, str) or not key:
         raise HTTPException(status_code=400, detail="model_key is required")
     try:
-        model_mgr.load(key)
-        # Changing the global model invalidates any session predictors/features.
-        session_mgr.clear()
+        _switch_model(key)
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e)) from e
     return {"ok": True, "model": model_mgr.info()}
@@ -103,35 +130,135 @@ def create_session(payload: Optional[Dict[str, Any]] = None) -> SessionCreatedRe
             model_key = mk
     if model_key:
         try:
-            model_mgr.load(model_key)
-            session_mgr.clear()
+            _switch_model(model_key)
         except FileNotFoundError as e:
             raise HTTPException(status_code=404, detail=str(e)) from e
     sid = session_mgr.create()
     return SessionCreatedResponse(session_id=sid, model=model_mgr.info())
 
 
+async def _set_image(session_id: str, image: BinaryIO) -> SessionImageResponse:
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(INFER_EXECUTOR, session_mgr.set_image, session_id, image)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="session not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
 @app.post("/sessions/{session_id}/image", response_model=SessionImageResponse)
 async def set_image(session_id: str, file: UploadFile = File(...)) -> SessionImageResponse:
     if not file:
         raise HTTPException(status_code=400, detail="file is required")
-    data = await file.read()
-    if not data:
-        raise HTTPException(status_code=400, detail="empty upload")
+    # The multipart parser already spooled the upload; hand over the file instead of
+    # reading it into one more in-memory copy.
+    return await _set_image(session_id, file.file)
+
+
+@app.post("/sessions/{session_id}/image_raw", response_model=SessionImageResponse)
+async def set_image_raw(session_id: str, request: Request) -> SessionImageResponse:
+    # Raw image bytes as the request body (application/octet-stream): no multipart parsing.
+    with tempfile.SpooledTemporaryFile(max_size=16 << 20) as spool:
+        async for chunk in request.stream():
+            # Like Starlette's UploadFile: write in memory on the loop, but push disk writes
+            # to the threadpool once the spool has rolled over.
+            if spool._rolled:
+                await run_in_threadpool(spool.write, chunk)
+            else:
+                spool.write(chunk)
+        spool.seek(0)
+        return await _set_image(session_id, spool)
+
+
+@app.post("/sessions/{session_id}/predict", response_model=PredictResponse)
+async def predict(session_id: str, req: PredictRequest) -> PredictResponse:
     try:
-        return session_mgr.set_image(session_id=session_id, image_bytes=data)
+        return await session_mgr.predict(session_id, req)
     except KeyError:
         raise HTTPException(status_code=404, detail="session not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
 
 
-@app.post("/sessions/{session_id}/predict", response_model=PredictResponse)
-def predict(session_id: str, req: PredictRequest) -> PredictResponse:
+@app.post("/sessions/{session_id}/predict.png", response_class=Response)
+async def predict_png(session_id: str, req: PredictRequest) -> Response:
+    # Same as /predict, but the mask PNG is the raw body (no base64: ~33% fewer bytes and
+    # no extra encode/decode pass); scalar results travel in headers.
     try:
-        return session_mgr.predict(session_id=session_id, req=req)
+        png, score, mask_area, elapsed_ms = await session_mgr.predict_png(session_id, req)
     except KeyError:
         raise HTTPException(status_code=404, detail="session not found")
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e)) from e
+    return Response(
+        content=png,
+        media_type="image/png",
+        headers={
+            "X-SAM2-Score": repr(score),
+            "X-SAM2-Mask-Area": str(mask_area),
+            "X-SAM2-Elapsed-Ms": f"{elapsed_ms:.3f}",
+        },
+    )
+
+
+# WebSocket prompt frame: header (num_points: u8, has_box: u8, multimask: u8), then
+# num_points * (x, y) float32, num_points int32 labels, and (x0, y0, x1, y1) float32 if has_box.
+# Reply frame: (score: f32, mask_area: u32, elapsed_ms: f32) followed by the mask PNG.
+# All little-endian. Errors come back as a JSON text frame; the socket stays open.
+_WS_PROMPT_HEADER = struct.Struct("<BBB")
+_WS_REPLY_HEADER = struct.Struct("<fIf")
+
+
+def _parse_ws_prompt(msg: bytes) -> Tuple[Optional[np.ndarray], Optional[np.ndarray], Optional[np.ndarray], bool]:
+    if len(msg) < _WS_PROMPT_HEADER.size:
+        raise ValueError("malformed prompt frame: truncated header")
+    num_points, has_box, multimask = _WS_PROMPT_HEADER.unpack_from(msg, 0)
+    off = _WS_PROMPT_HEADER.size
+    expected = off + 12 * num_points + (16 if has_box else 0)
+    if len(msg) != expected:
+        raise ValueError(f"malformed prompt frame: expected {expected} bytes, got {len(msg)}")
+    # Straight from the frame into arrays; astype copies into writable native-order buffers.
+    points = labels = box = None
+    if num_points:
+        points = np.frombuffer(msg, "<f4", 2 * num_points, off).astype(np.float32).reshape(-1, 2)
+        off += 8 * num_points
+        labels = np.frombuffer(msg, "<i4", num_points, off).astype(np.int32)
+        off += 4 * num_points
+    if has_box:
+        box = np.frombuffer(msg, "<f4", 4, off).astype(np.float32)
+    return points, labels, box, bool(multimask)
+
+
+@app.websocket("/ws/sessions/{session_id}")
+async def predict_ws(ws: WebSocket, session_id: str) -> None:
+    # Streaming alternative to /predict.png for interactive clients: one connection,
+    # binary frames, no per-request HTTP overhead or base64.
+    await ws.accept()
+    if not session_mgr.exists(session_id):
+        await ws.close(code=4404, reason="session not found")
+        return
+    try:
+        while True:
+            message = await ws.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            data = message.get("bytes")
+            if data is None:
+                await ws.send_json({"error": "expected a binary prompt frame"})
+                continue
+            try:
+                prompt = _parse_ws_prompt(data)
+                png, score, mask_area, elapsed_ms = await session_mgr.predict_png_arrays(session_id, *prompt)
+            except KeyError:
+                await ws.close(code=4404, reason="session not found")
+                return
+            except ValueError as e:
+                await ws.send_json({"error": str(e)})
+                continue
+            await ws.send_bytes(_WS_REPLY_HEADER.pack(score, mask_area, elapsed_ms) + png)
+    except WebSocketDisconnect:
+        pass
 
 
 @app.delete("/sessions/{session_id}")
@@ -10,11 +10,11 @@
     - run server\main.py
 
 .EXAMPLE
-    .\server\launch.ps1 --image C:\path\to\image.jpg --point 320 240
+    .\server\launch.ps1
+    # HTTP server on 0.0.0.0:8000
 
 .EXAMPLE
-    .\server\launch.ps1
-    # uses synthetic image; prompts to select a local SAM2 model
+    .\server\launch.ps1 --port 9000 --workers 2
 #>
 
 param(
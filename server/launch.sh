@@ -11,8 +11,8 @@ set -euo pipefail
 #   ./server/launch.sh [args passed to main.py]
 #
 # Examples:
-#   ./server/launch.sh --image /path/to/image.jpg --point 320 240
-#   ./server/launch.sh   # uses synthetic image; prompts to select a local SAM2 model
+#   ./server/launch.sh                  # HTTP server on 0.0.0.0:8000
+#   ./server/launch.sh --port 9000 --workers 2
 
 ROOT="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 VENV_DIR="${ROOT}/.venv"
@@ -15,7 +15,16 @@ def main() -> int:
     ap.add_argument("--port", type=int, default=int(os.environ.get("SAM2_SERVER_PORT", "8000")))
     ap.add_argument("--log-level", default=os.environ.get("SAM2_SERVER_LOG_LEVEL", "info"))
     ap.add_argument("--reload", action="store_true", help="Dev mode auto-reload (not recommended with MPS).")
+    ap.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.environ.get("SAM2_WORKERS", "1")),
+        help="Worker processes (each loads its own model copy). Sessions live in-process, "
+        "so >1 needs a sticky load balancer in front.",
+    )
     args = ap.parse_args()
+    if args.workers > 1 and args.reload:
+        ap.error("--reload cannot be combined with --workers > 1")
 
     # Make `import server.*` work even if the user runs from inside `server/`.
     repo_root = Path(__file__).resolve().parents[1]
@@ -28,6 +37,8 @@ def main() -> int:
         port=args.port,
         log_level=args.log_level,
         reload=bool(args.reload),
+        # Uvicorn spawns (not forks) workers, so CUDA/MPS state is never inherited.
+        workers=max(1, args.workers),
     )
     return 0
 
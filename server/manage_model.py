@@ -12,14 +12,21 @@ then prompts you to download by index (or 'a' to download all missing).
 from __future__ import annotations
 
 import argparse
+import base64
+import contextlib
+import http.client
+import json
 import os
 import sys
+import threading
 import time
 import urllib.error
+import urllib.parse
 import urllib.request
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable, List, Sequence
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 
 @dataclass(frozen=True)
@@ -82,6 +89,32 @@ def _model_present(m: ModelSpec, root: Path) -> bool:
     return _is_present(m.local_path(root))
 
 
+def _local_sizes(models: Sequence[ModelSpec], root: Path) -> Dict[str, int]:
+    """Checkpoint size per model key (0 if missing), from one scandir per model directory.
+
+    Entries are filtered by name first, so only catalog checkpoints are stat()ed (not
+    .part files or anything else there). DirEntry.stat() is still one syscall per file
+    on POSIX; only Windows fills it in from the directory read.
+    """
+    by_dir: Dict[Path, List[ModelSpec]] = {}
+    for m in models:
+        by_dir.setdefault(m.local_path(root).parent, []).append(m)
+    sizes: Dict[str, int] = {}
+    for d, specs in by_dir.items():
+        wanted = {m.filename for m in specs}
+        entries: Dict[str, int] = {}
+        try:
+            with os.scandir(d) as it:
+                for e in it:
+                    if e.name in wanted and e.is_file():
+                        entries[e.name] = e.stat().st_size
+        except FileNotFoundError:
+            pass
+        for m in specs:
+            sizes[m.key] = entries.get(m.filename, 0)
+    return sizes
+
+
 def _fmt_size(num_bytes: int) -> str:
     units = ["B", "KB", "MB", "GB", "TB"]
     n = float(num_bytes)
@@ -94,53 +127,327 @@ def _fmt_size(num_bytes: int) -> str:
     return f"{num_bytes}B"
 
 
-def _download(url: str, out_path: Path, timeout_s: int = 60) -> None:
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    tmp_path = out_path.with_suffix(out_path.suffix + ".part")
+_USER_AGENT = "sam-flutter-model-manager/1.0"
+_CHUNK_BYTES = 1024 * 1024  # 1MB
+# Below this size a single connection is fine; above it, fetch byte ranges in parallel.
+_PARALLEL_MIN_BYTES = 32 * 1024 * 1024
+
+
+_MAX_REDIRECTS = 5
+# Transient failures (connection errors, 5xx/429) are retried with exponential backoff:
+# 1s, 2s, 4s, ... Ranges and single-connection downloads resume where they stopped.
+_RETRIES = 5
+_RETRY_BACKOFF_S = 1.0
+
+
+def _proxy_for(scheme: str, netloc: str) -> Optional[urllib.parse.SplitResult]:
+    """The proxy urllib would use for this URL (HTTP(S)_PROXY / NO_PROXY), if any."""
+    host = urllib.parse.urlsplit(f"//{netloc}").hostname or netloc
+    proxy = urllib.request.getproxies().get(scheme)
+    if not proxy or urllib.request.proxy_bypass(host):
+        return None
+    return urllib.parse.urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+
+
+def _proxy_auth(proxy: urllib.parse.SplitResult) -> Dict[str, str]:
+    if not proxy.username:
+        return {}
+    cred = f"{urllib.parse.unquote(proxy.username)}:{urllib.parse.unquote(proxy.password or '')}"
+    return {"Proxy-Authorization": "Basic " + base64.b64encode(cred.encode()).decode("ascii")}
+
+
+class _ConnectionPool:
+    """Keep-alive HTTP(S) connections shared by every request this script makes.
+
+    The HEAD probe, each parallel range and every further checkpoint reuse an idle
+    connection to the same host instead of paying a new TCP + TLS handshake per request
+    (which is what urllib.request does). Stdlib only, so the script runs without the venv.
+    Proxies from the environment are honored like urllib does: HTTPS is tunneled with
+    CONNECT, plain HTTP is forwarded with absolute-form request targets.
+    """
+
+    def __init__(self, maxsize: int = 8) -> None:
+        self._lock = threading.Lock()
+        self._idle: Dict[Tuple[str, str], List[http.client.HTTPConnection]] = {}
+        self._maxsize = maxsize
+
+    def _connect(
+        self, scheme: str, netloc: str, proxy: Optional[urllib.parse.SplitResult], timeout_s: int
+    ) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get((scheme, netloc))
+            if idle:
+                return idle.pop(), True
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        if proxy is None:
+            return cls(netloc, timeout=timeout_s), False
+        conn = cls(proxy.hostname, proxy.port or 80, timeout=timeout_s)
+        if scheme == "https":
+            target = urllib.parse.urlsplit(f"//{netloc}")
+            conn.set_tunnel(target.hostname, target.port, headers=_proxy_auth(proxy))
+        return conn, False
+
+    def _release(self, scheme: str, netloc: str, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault((scheme, netloc), [])
+            if len(idle) < self._maxsize:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def _send(
+        self, url: str, method: str, headers: Dict[str, str], timeout_s: int
+    ) -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+        parts = urllib.parse.urlsplit(url)
+        path = urllib.parse.urlunsplit(("", "", parts.path or "/", parts.query, ""))
+        proxy = _proxy_for(parts.scheme, parts.netloc)
+        if proxy is not None and parts.scheme == "http":
+            # Forwarding proxy: send the absolute URL (and credentials) to the proxy.
+            path = urllib.parse.urlunsplit((parts.scheme, parts.netloc, parts.path or "/", parts.query, ""))
+            headers = {**headers, **_proxy_auth(proxy)}
+        while True:
+            conn, reused = self._connect(parts.scheme, parts.netloc, proxy, timeout_s)
+            try:
+                conn.request(method, path, headers=headers)
+                return conn, conn.getresponse()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                if not reused:
+                    raise
+                # The server dropped an idle keep-alive connection; retry on a fresh one.
+
+    @contextlib.contextmanager
+    def open(
+        self, url: str, headers: Optional[Dict[str, str]] = None, method: str = "GET", timeout_s: int = 60
+    ) -> Iterator[http.client.HTTPResponse]:
+        h = {"User-Agent": _USER_AGENT}
+        h.update(headers or {})
+        for _ in range(_MAX_REDIRECTS + 1):
+            parts = urllib.parse.urlsplit(url)
+            conn, resp = self._send(url, method, h, timeout_s)
+            location = resp.getheader("Location")
+            if resp.status in (301, 302, 303, 307, 308) and location:
+                resp.read()
+                self._release(parts.scheme, parts.netloc, conn)
+                url = urllib.parse.urljoin(url, location)
+                continue
+            if resp.status >= 400:
+                resp.read()
+                self._release(parts.scheme, parts.netloc, conn)
+                raise urllib.error.HTTPError(url, resp.status, resp.reason, resp.headers, None)
+            try:
+                yield resp
+            finally:
+                if not resp.isclosed() and resp.length == 0:
+                    resp.read()  # e.g. HEAD: nothing to read, but marks the response done.
+                if resp.isclosed() and not resp.will_close:
+                    self._release(parts.scheme, parts.netloc, conn)
+                else:
+                    # Body not fully read (or server closes): the socket can't be reused.
+                    conn.close()
+            return
+        raise urllib.error.URLError(f"too many redirects for {url}")
+
+
+_HTTP = _ConnectionPool()
+
+
+def _probe(url: str, timeout_s: int) -> Tuple[Optional[int], bool]:
+    """HEAD the URL: (Content-Length or None, whether byte ranges are supported)."""
+    try:
+        with _HTTP.open(url, method="HEAD", timeout_s=timeout_s) as resp:
+            total = resp.headers.get("Content-Length")
+            ranges = resp.headers.get("Accept-Ranges", "").strip().lower() == "bytes"
+            return (int(total) if total and total.isdigit() else None), ranges
+    except (urllib.error.URLError, http.client.HTTPException, OSError):
+        # Some servers reject HEAD; the plain GET path below still works.
+        return None, False
+
 
-    if tmp_path.exists():
-        # Start fresh; .part might be from an interrupted run.
+def _with_retries(fn: Callable[..., Any], *args: Any, stop: Optional[threading.Event] = None) -> None:
+    for attempt in range(_RETRIES + 1):
         try:
-            tmp_path.unlink()
-        except OSError:
-            pass
+            fn(*args)
+            return
+        except urllib.error.HTTPError as e:
+            if (e.code < 500 and e.code != 429) or attempt == _RETRIES:
+                raise
+            err: Exception = e
+        except (http.client.HTTPException, OSError) as e:
+            if attempt == _RETRIES:
+                raise
+            err = e
+        delay = _RETRY_BACKOFF_S * 2**attempt
+        print(f"\n  {err}; retrying in {delay:.0f}s")
+        if stop is not None:
+            if stop.wait(delay):
+                return  # Another range failed or Ctrl-C: give up quietly.
+        else:
+            time.sleep(delay)
 
-    req = urllib.request.Request(url, headers={"User-Agent": "sam-flutter-model-manager/1.0"})
-    t0 = time.time()
-    try:
-        with urllib.request.urlopen(req, timeout=timeout_s) as resp:
+
+def _print_progress(downloaded: int, total_bytes: Optional[int]) -> None:
+    if total_bytes:
+        pct = (downloaded / total_bytes) * 100.0
+        print(
+            f"  {_fmt_size(downloaded)} / {_fmt_size(total_bytes)} ({pct:.1f}%)",
+            end="\r",
+            flush=True,
+        )
+    else:
+        print(f"  {_fmt_size(downloaded)}", end="\r", flush=True)
+
+
+class _RangesIgnored(Exception):
+    """The server answered a range request with the whole file; not worth retrying."""
+
+
+def _state_path(tmp_path: Path) -> Path:
+    # Range progress of a parallel download, next to its .part file.
+    return tmp_path.with_suffix(tmp_path.suffix + ".json")
+
+
+def _download_single(
+    url: str, tmp_path: Path, total_bytes: Optional[int], ranges: bool, timeout_s: int
+) -> None:
+    # Resume an interrupted single-connection download when the server allows it.
+    offset = 0
+    if ranges and tmp_path.exists():
+        offset = tmp_path.stat().st_size
+        if total_bytes is not None and offset >= total_bytes:
+            offset = 0
+    headers = {"Range": f"bytes={offset}-"} if offset else None
+
+    with _HTTP.open(url, headers, timeout_s=timeout_s) as resp:
+        if offset and resp.status != 206:
+            offset = 0  # Server ignored the range; start over.
+        if offset:
+            print(f"  resuming at {_fmt_size(offset)}")
+        else:
+            # Starting over: range state left by an earlier parallel run no longer applies.
+            _state_path(tmp_path).unlink(missing_ok=True)
+        if total_bytes is None:
             total = resp.headers.get("Content-Length")
             total_bytes = int(total) if total and total.isdigit() else None
 
-            downloaded = 0
-            last_print = 0.0
-            with tmp_path.open("wb") as f:
+        downloaded = offset
+        last_print = 0.0
+        with tmp_path.open("ab" if offset else "wb") as f:
+            while True:
+                chunk = resp.read(_CHUNK_BYTES)
+                if not chunk:
+                    break
+                f.write(chunk)
+                downloaded += len(chunk)
+                now = time.time()
+                if now - last_print >= 0.5:
+                    _print_progress(downloaded, total_bytes)
+                    last_print = now
+
+
+def _load_parts(state_path: Path, url: str, total_bytes: int) -> Optional[List[List[int]]]:
+    try:
+        state = json.loads(state_path.read_text())
+    except (OSError, ValueError):
+        return None
+    if state.get("url") != url or state.get("size") != total_bytes:
+        return None
+    return state.get("parts")
+
+
+def _save_parts(state_path: Path, url: str, total_bytes: int, parts: List[List[int]]) -> None:
+    state_path.write_text(json.dumps({"url": url, "size": total_bytes, "parts": parts}))
+
+
+def _fetch_range(url: str, tmp_path: Path, part: List[int], stop: threading.Event, timeout_s: int) -> None:
+    # part is [start, end (exclusive), next offset to write]; updated in place as we go.
+    start, end, pos = part
+    if pos >= end:
+        return
+    headers = {"Range": f"bytes={pos}-{end - 1}"}
+    with _HTTP.open(url, headers, timeout_s=timeout_s) as resp, tmp_path.open("r+b") as f:
+        if resp.status != 206:
+            raise _RangesIgnored(f"server ignored range request for bytes {pos}-{end - 1}")
+        f.seek(pos)
+        while pos < end and not stop.is_set():
+            chunk = resp.read(min(_CHUNK_BYTES, end - pos))
+            if not chunk:
+                break
+            f.write(chunk)
+            f.flush()  # Record progress only for bytes handed to the OS.
+            pos += len(chunk)
+            part[2] = pos
+    if pos < end and not stop.is_set():
+        raise OSError(f"connection closed early at byte {pos} (expected {end})")
+
+
+def _download_parallel(url: str, tmp_path: Path, total_bytes: int, workers: int, timeout_s: int) -> None:
+    state_path = _state_path(tmp_path)
+    parts = _load_parts(state_path, url, total_bytes) if tmp_path.exists() else None
+    if parts is None:
+        size = -(-total_bytes // workers)
+        parts = [[a, min(a + size, total_bytes), a] for a in range(0, total_bytes, size)]
+        with tmp_path.open("wb") as f:
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(f.fileno(), 0, total_bytes)
+            else:
+                f.truncate(total_bytes)
+    else:
+        done = sum(p[2] - p[0] for p in parts)
+        print(f"  resuming at {_fmt_size(done)}")
+
+    stop = threading.Event()
+    try:
+        with ThreadPoolExecutor(max_workers=len(parts)) as ex:
+            futs = [
+                ex.submit(_with_retries, _fetch_range, url, tmp_path, p, stop, timeout_s, stop=stop)
+                for p in parts
+            ]
+            try:
                 while True:
-                    chunk = resp.read(1024 * 1024)  # 1MB
-                    if not chunk:
+                    finished, pending = wait(futs, timeout=0.5, return_when=FIRST_EXCEPTION)
+                    _print_progress(sum(p[2] - p[0] for p in parts), total_bytes)
+                    if not pending or any(f.exception() for f in finished):
                         break
-                    f.write(chunk)
-                    downloaded += len(chunk)
-                    now = time.time()
-                    if now - last_print >= 0.5:
-                        if total_bytes:
-                            pct = (downloaded / total_bytes) * 100.0
-                            print(
-                                f"  {_fmt_size(downloaded)} / {_fmt_size(total_bytes)} ({pct:.1f}%)",
-                                end="\r",
-                                flush=True,
-                            )
-                        else:
-                            print(f"  {_fmt_size(downloaded)}", end="\r", flush=True)
-                        last_print = now
+            finally:
+                # Ctrl-C or a failed range: stop the other workers.
+                stop.set()
+    finally:
+        # Lets the next run re-request only the missing byte ranges.
+        _save_parts(state_path, url, total_bytes, parts)
+    for f in futs:
+        f.result()
+    state_path.unlink()
+
+
+def _download(url: str, out_path: Path, timeout_s: int = 60, workers: int = 8) -> None:
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    # A leftover .part (plus its .part.json range state) from an interrupted run is resumed.
+    tmp_path = out_path.with_suffix(out_path.suffix + ".part")
+
+    t0 = time.time()
+    try:
+        total_bytes, ranges = _probe(url, timeout_s)
+        if ranges and total_bytes is not None and total_bytes >= _PARALLEL_MIN_BYTES and workers > 1:
+            try:
+                _download_parallel(url, tmp_path, total_bytes, workers, timeout_s)
+            except _RangesIgnored as e:
+                # Advertised Accept-Ranges but sent the whole file: use one connection instead.
+                print(f"\n  {e}; falling back to a single connection")
+                _with_retries(_download_single, url, tmp_path, total_bytes, False, timeout_s)
+        else:
+            _with_retries(_download_single, url, tmp_path, total_bytes, ranges, timeout_s)
     except urllib.error.HTTPError as e:
         raise SystemExit(f"HTTP error downloading {url}: {e.code} {e.reason}") from e
     except urllib.error.URLError as e:
         raise SystemExit(f"Network error downloading {url}: {e}") from e
+    except (OSError, http.client.HTTPException) as e:
+        raise SystemExit(f"Error downloading {url}: {e} (re-run to resume)") from e
 
+    print(" " * 80, end="\r")  # clear progress line
     tmp_path.replace(out_path)
+    _state_path(tmp_path).unlink(missing_ok=True)
     dt = time.time() - t0
-    print(" " * 80, end="\r")  # clear progress line
     print(f"  done in {dt:.1f}s -> {out_path}")
 
 
@@ -148,16 +455,17 @@ def _print_inventory(models: Sequence[ModelSpec], root: Path) -> None:
     sam2_count = sum(1 for m in models if m.family == "sam2")
     print(f"SAM2.1 models: {sam2_count}")
     print()
+    sizes = _local_sizes(models, root)
     existing: List[ModelSpec] = []
     missing: List[ModelSpec] = []
     for m in models:
-        (existing if _model_present(m, root) else missing).append(m)
+        (existing if sizes[m.key] > 0 else missing).append(m)
 
     if existing:
         print("Already present:")
         for m in existing:
             ckpt_path = m.local_path(root)
-            ckpt_size = _fmt_size(ckpt_path.stat().st_size)
+            ckpt_size = _fmt_size(sizes[m.key])
             print(f"  - {m.key:22s} {ckpt_size:>8s}  ({ckpt_path})")
     else:
         print("Already present: (none)")
@@ -195,7 +503,8 @@ def _parse_selection(sel: str, max_index: int) -> List[int]:
 
 
 def _missing_models(models: Sequence[ModelSpec], root: Path) -> List[ModelSpec]:
-    return [m for m in models if not _model_present(m, root)]
+    sizes = _local_sizes(models, root)
+    return [m for m in models if sizes[m.key] == 0]
 
 
 def main() -> int:
@@ -210,6 +519,17 @@ def main() -> int:
         action="store_true",
         help="Just print inventory and exit (no downloads).",
     )
+    ap.add_argument(
+        "--download",
+        nargs="+",
+        metavar="MODEL_KEY",
+        help="Download these models (e.g. sam2.1_hiera_small) without prompting.",
+    )
+    ap.add_argument(
+        "--all-missing",
+        action="store_true",
+        help="Download every missing model without prompting.",
+    )
     args = ap.parse_args()
 
     root = Path(args.root).resolve() if args.root else _repo_root()
@@ -220,11 +540,26 @@ def main() -> int:
         return 0
 
     missing = _missing_models(models, root)
+    if args.download:
+        by_key = {m.key: m for m in models}
+        unknown = [k for k in args.download if k not in by_key]
+        if unknown:
+            ap.error(f"unknown model key(s): {', '.join(unknown)} (choose from: {', '.join(by_key)})")
+        wanted = set(args.download)
+        missing = [m for m in missing if m.key in wanted]
+        args.all_missing = True
     if not missing:
         print("Nothing to download.")
         return 0
 
-    while True:
+    if args.all_missing:
+        chosen = list(range(1, len(missing) + 1))
+    elif not sys.stdin.isatty():
+        # Scripted/CI use: never block on a prompt nobody can answer.
+        print("stdin is not a terminal; pass --download KEY ... or --all-missing to download.")
+        return 0
+
+    while not args.all_missing:
         sel = input(
             "Select models to download by index (e.g. '1 3 5'), 'a' for all missing, or 'q' to quit: "
         ).strip()
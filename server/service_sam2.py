@@ -1,14 +1,23 @@
 from __future__ import annotations
 
+import asyncio
 import base64
+import binascii
+import contextlib
+import functools
+import hashlib
 import os
+import queue
+import stat
 import threading
 import time
 import uuid
-from dataclasses import dataclass
+from collections import OrderedDict
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
 from io import BytesIO
 from pathlib import Path
-from typing import Any, Dict, List, Literal, Optional, Tuple
+from typing import Any, BinaryIO, Callable, ContextManager, Dict, Iterator, List, Literal, Optional, Tuple, Union
 
 import numpy as np
 from PIL import Image
@@ -17,12 +26,25 @@ from pydantic import BaseModel, Field
 
 DEFAULT_MODEL_KEY = "sam2.1_hiera_tiny"
 
+# Read by the CUDA caching allocator on first use, i.e. before torch is imported here.
+# Expandable segments let the pool grow in place instead of fragmenting across the
+# differently sized encoder / decoder / per-batch allocations.
+os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True")
+
 
 def _server_dir() -> Path:
     return Path(__file__).resolve().parent
 
 
+def _env_flag(name: str, default: str) -> bool:
+    return os.environ.get(name, default).strip() not in ("0", "false", "False", "")
+
+
+@functools.lru_cache(maxsize=1)
 def _best_device() -> str:
+    # Cached: the torch import + availability probes ran on every /health hit.
+    # Use _best_device.cache_clear() to re-probe.
+
     # Env override.
     requested = os.environ.get("SAM2_DEVICE", "auto").strip().lower()
     if requested and requested != "auto":
@@ -37,7 +59,100 @@ def _best_device() -> str:
     return "cpu"
 
 
+def _hash_stream(stream: BinaryIO) -> Tuple[bytes, int]:
+    """blake2b digest and size of a seekable stream, read in chunks; rewinds it afterwards."""
+    h = hashlib.blake2b(digest_size=16)
+    size = 0
+    for chunk in iter(lambda: stream.read(1 << 20), b""):
+        h.update(chunk)
+        size += len(chunk)
+    stream.seek(0)
+    return h.digest(), size
+
+
+def _decode_rgb(stream: BinaryIO, size: int) -> np.ndarray:
+    """Decode an upload of ``size`` bytes into an (H, W, 3) uint8 array."""
+    is_jpeg = stream.read(2) == b"\xff\xd8"
+    stream.seek(0)
+    if is_jpeg:
+        # JPEG: torchvision's libjpeg-turbo decoder produces RGB directly, skipping PIL's
+        # decode + convert copies. SAM2ImagePredictor only accepts host images, so decode
+        # on CPU; a GPU (nvJPEG) decode would just be copied back. The HWC view over the
+        # CHW tensor is transposed back without a copy by SAM2's ToTensor.
+        try:
+            import torch
+            from torchvision.io import ImageReadMode, decode_jpeg
+
+            # One writable buffer filled in place, rather than read()'s bytes plus a copy.
+            buf = bytearray(size)
+            view = memoryview(buf)
+            filled = 0
+            while filled < size:
+                n = stream.readinto(view[filled:])
+                if not n:
+                    raise ValueError("upload changed size while decoding")
+                filled += n
+            data = torch.frombuffer(buf, dtype=torch.uint8)
+            return decode_jpeg(data, mode=ImageReadMode.RGB).permute(1, 2, 0).numpy()
+        except (ImportError, RuntimeError):
+            stream.seek(0)  # Fall back to PIL (unusual JPEG flavours, missing torchvision).
+    # PIL reads straight from the (possibly disk-spooled) stream.
+    img = Image.open(stream).convert("RGB")
+    return np.asarray(img, dtype=np.uint8)
+
+
+def _encode_mask_png(mask: np.ndarray) -> bytes:
+    # PNG encode mask as an RGBA alpha mask:
+    # - RGB is white
+    # - Alpha is 0/255 for background/foreground
+    # This makes client-side compositing easy (dstIn).
+    if mask.dtype == np.bool_:
+        # Predictor masks are bool: reinterpret as 0/1 bytes and scale in a uint8 loop.
+        m8 = np.multiply(mask.view(np.uint8), np.uint8(255))
+    elif mask.dtype != np.uint8:
+        # One pass straight into the uint8 buffer (no astype temp, no second multiply temp).
+        m8 = np.multiply(mask, 255, out=np.empty(mask.shape, dtype=np.uint8), casting="unsafe")
+    else:
+        m8 = mask
+    # Assemble the bands directly: one constant white plane reused for R, G and B, rather
+    # than filling a full RGBA image and then overwriting its alpha band.
+    alpha = Image.fromarray(m8, mode="L")
+    white = Image.new("L", alpha.size, 255)
+    rgba = Image.merge("RGBA", (white, white, white, alpha))
+    # Binary masks deflate well even at level 1, for a fraction of the default level-6 CPU.
+    out = BytesIO()
+    rgba.save(out, format="PNG", compress_level=1, optimize=False)
+    return out.getvalue()
+
+
+def _b64_array(data: str, dtype: Any, name: str) -> np.ndarray:
+    # One memcpy from the decoded little-endian bytes instead of converting nested Python
+    # lists element by element. astype copies, so the result is writable (torch.as_tensor
+    # warns on read-only arrays) and in native byte order.
+    try:
+        raw = base64.b64decode(data, validate=True)
+    except binascii.Error as e:
+        raise ValueError(f"{name} is not valid base64: {e}") from e
+    dt = np.dtype(dtype)
+    if len(raw) % dt.itemsize:
+        raise ValueError(f"{name} length is not a multiple of {dt.itemsize} bytes.")
+    return np.frombuffer(raw, dtype=dt.newbyteorder("<")).astype(dt)
+
+
+def _encode_mask_rle(mask: np.ndarray) -> Dict[str, Any]:
+    # Run lengths over the column-major flattened mask (COCO convention); no PNG/deflate.
+    h, w = mask.shape
+    flat = (mask > 0).ravel(order="F")
+    change = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    counts = np.diff(np.concatenate(([0], change, [flat.size])))
+    if flat.size and flat[0]:
+        counts = np.concatenate(([0], counts))
+    return {"size": [int(h), int(w)], "counts": counts.tolist()}
+
+
+@functools.lru_cache(maxsize=1)
 def _catalog() -> Dict[str, Dict[str, str]]:
+    # Built once; treat the returned dict as read-only.
     # Configs live inside the installed `sam2` Python package. We only need local checkpoints.
     base = _server_dir() / "models" / "sam2"
     return {
@@ -60,6 +175,42 @@ def _catalog() -> Dict[str, Dict[str, str]]:
     }
 
 
+@contextlib.contextmanager
+def _mmap_torch_load() -> Iterator[None]:
+    """Make the torch.load inside sam2's build_sam2 mmap the checkpoint.
+
+    Weights are paged in on demand and shared with the page cache instead of being
+    read into RAM up front: faster cold starts and lower RSS for the large models.
+    """
+    import torch
+
+    orig = torch.load
+    torch.load = functools.partial(orig, mmap=True, weights_only=True)
+    try:
+        yield
+    finally:
+        torch.load = orig
+
+
+_STAT_TTL_S = 2.0
+_stat_cache: Dict[str, Tuple[float, int]] = {}
+
+
+def _checkpoint_size(path: str) -> int:
+    """Size of a checkpoint file (0 if missing), memoized briefly for /models polling."""
+    now = time.monotonic()
+    hit = _stat_cache.get(path)
+    if hit is not None and now - hit[0] < _STAT_TTL_S:
+        return hit[1]
+    try:
+        st = os.stat(path)
+        size = int(st.st_size) if stat.S_ISREG(st.st_mode) else 0
+    except OSError:
+        size = 0
+    _stat_cache[path] = (now, size)
+    return size
+
+
 class ModelInfo(BaseModel):
     model_key: str
     device: str
@@ -72,8 +223,13 @@ class PredictRequest(BaseModel):
     points: Optional[List[List[float]]] = None
     labels: Optional[List[int]] = None  # 1=fg, 0=bg
     box: Optional[List[float]] = None  # [x0, y0, x1, y1]
+    # Binary alternatives for large prompts: base64 of little-endian float32 (x, y) pairs,
+    # int32 labels and float32 box. Each takes precedence over its list form when set.
+    points_b64: Optional[str] = None
+    labels_b64: Optional[str] = None
+    box_b64: Optional[str] = None
     multimask: bool = False
-    return_format: Literal["png_base64"] = "png_base64"
+    return_format: Literal["png_base64", "rle"] = "png_base64"
 
 
 class PredictResponse(BaseModel):
@@ -81,7 +237,14 @@ class PredictResponse(BaseModel):
     session_id: str
     score: float
     mask_area: int
-    mask_png_base64: str = Field(..., description="PNG-encoded RGBA mask (alpha=0/255) in base64")
+    mask_png_base64: Optional[str] = Field(
+        None, description="PNG-encoded RGBA mask (alpha=0/255) in base64 (return_format='png_base64')"
+    )
+    mask_rle: Optional[Dict[str, Any]] = Field(
+        None,
+        description="COCO-style uncompressed RLE {'size': [h, w], 'counts': [...]}, column-major, "
+        "starting with a background run (return_format='rle')",
+    )
     elapsed_ms: float
 
 
@@ -97,30 +260,152 @@ class SessionImageResponse(BaseModel):
     elapsed_ms: float
 
 
+def _tensor_spec(v: Any) -> Any:
+    if hasattr(v, "shape") and hasattr(v, "dtype"):
+        return ("tensor", tuple(v.shape), v.dtype, v.device)
+    if isinstance(v, (list, tuple)):
+        return tuple(_tensor_spec(x) for x in v)
+    return v
+
+
+def _clone_args(v: Any) -> Any:
+    if hasattr(v, "clone"):
+        return v.clone()
+    if isinstance(v, (list, tuple)):
+        return type(v)(_clone_args(x) for x in v)
+    if isinstance(v, dict):
+        return {k: _clone_args(x) for k, x in v.items()}
+    return v
+
+
+def _cloning_outputs(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap a ``reduce-overhead`` compiled forward so callers own its outputs.
+
+    Those outputs live in CUDA-graph memory that the next replay overwrites, while
+    set_image keeps the encoder's in ``predictor._features`` (shared via the embedding
+    cache). SAM2's own ``vos_optimized`` path clones them for the same reason.
+    """
+
+    def forward(*args: Any, **kwargs: Any) -> Any:
+        return _clone_args(fn(*args, **kwargs))
+
+    return forward
+
+
+def _copy_args(dst: Any, src: Any) -> None:
+    if hasattr(dst, "copy_"):
+        dst.copy_(src)
+    elif isinstance(dst, (list, tuple)):
+        for d, x in zip(dst, src):
+            _copy_args(d, x)
+
+
+class _DecoderGraphs:
+    """Drop-in ``forward`` for the mask decoder that replays CUDA graphs.
+
+    Interactive use hits the decoder over and over with the same prompt shapes (one
+    click, one box) on the same embedding, so its dozens of small kernels are captured
+    once per input signature and replayed, skipping per-launch overhead. Inputs are
+    copied into the captured static buffers; outputs are cloned before returning since
+    the next replay overwrites them.
+    """
+
+    def __init__(self, forward: Callable[..., Any], max_graphs: int = 16) -> None:
+        import torch
+
+        self._forward = forward
+        self._max_graphs = max_graphs
+        # signature -> (graph, static kwargs, static outputs); None = run eagerly.
+        self._graphs: Dict[Any, Any] = {}
+        self._pool = torch.cuda.graph_pool_handle()
+        self._lock = threading.Lock()
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        import torch
+
+        if args:
+            return self._forward(*args, **kwargs)
+        autocast = torch.is_autocast_enabled("cuda")
+        key = (
+            tuple((k, _tensor_spec(v)) for k, v in sorted(kwargs.items())),
+            autocast,
+            torch.get_autocast_dtype("cuda") if autocast else None,
+        )
+        with self._lock:
+            if key not in self._graphs:
+                self._graphs[key] = self._capture(kwargs) if len(self._graphs) < self._max_graphs else None
+            entry = self._graphs[key]
+            if entry is None:
+                return self._forward(**kwargs)
+            graph, static_in, static_out = entry
+            for k, v in kwargs.items():
+                _copy_args(static_in[k], v)
+            graph.replay()
+            return _clone_args(static_out)
+
+    def _capture(self, kwargs: Dict[str, Any]) -> Any:
+        import torch
+
+        static_in = {k: _clone_args(v) for k, v in kwargs.items()}
+        try:
+            # Warm up on a side stream (cuBLAS/cuDNN handles, lazy inits) before capture.
+            side = torch.cuda.Stream()
+            side.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(side):
+                for _ in range(2):
+                    self._forward(**static_in)
+            torch.cuda.current_stream().wait_stream(side)
+
+            graph = torch.cuda.CUDAGraph()
+            # thread_local: other sessions may be running the encoder concurrently.
+            with torch.cuda.graph(graph, pool=self._pool, capture_error_mode="thread_local"):
+                static_out = self._forward(**static_in)
+        except RuntimeError:
+            return None  # Not capturable here; keep this signature eager.
+        return graph, static_in, static_out
+
+
 class ModelManager:
     def __init__(self) -> None:
         self._lock = threading.Lock()
         self._model_key: Optional[str] = None
         self._device: Optional[str] = None
         self._model = None
+        self._autocast_dtype = None
+        # info() runs on every /health hit and every predict; load() stores the new model's
+        # info, and _info_lock keeps a lazily built default from overwriting it.
+        self._info_lock = threading.Lock()
+        self._info_cache: Optional[ModelInfo] = None
+        # Built (and possibly compiled) models by (model_key, device), so switching back to a
+        # recently used model skips the rebuild. The default of 1 keeps only the current one.
+        self._models = _LRUCache(int(os.environ.get("SAM2_MODEL_CACHE", "1")))
 
     def list_models(self) -> List[Dict[str, Any]]:
         out: List[Dict[str, Any]] = []
         for key, v in _catalog().items():
-            ckpt = Path(v["checkpoint"])
+            size = _checkpoint_size(v["checkpoint"])
             out.append(
                 {
                     "model_key": key,
                     "config": v["config"],
                     "checkpoint": v["checkpoint"],
-                    "downloaded": ckpt.is_file() and ckpt.stat().st_size > 0,
-                    "checkpoint_size_bytes": int(ckpt.stat().st_size) if ckpt.is_file() else 0,
+                    "downloaded": size > 0,
+                    "checkpoint_size_bytes": size,
                 }
             )
         return out
 
     def info(self) -> ModelInfo:
-        key = self._model_key or DEFAULT_MODEL_KEY
+        cached = self._info_cache
+        if cached is not None:
+            return cached
+        with self._info_lock:
+            if self._info_cache is None:
+                self._info_cache = self._make_info(self._model_key or DEFAULT_MODEL_KEY, self._device)
+            return self._info_cache
+
+    @staticmethod
+    def _make_info(key: str, device: Optional[str]) -> ModelInfo:
         v = _catalog().get(key)
         if not v:
             # Shouldn't happen.
@@ -128,7 +413,7 @@ class ModelManager:
             key = DEFAULT_MODEL_KEY
         return ModelInfo(
             model_key=key,
-            device=self._device or _best_device(),
+            device=device or _best_device(),
             config=v["config"],
             checkpoint=v["checkpoint"],
         )
@@ -149,11 +434,116 @@ class ModelManager:
                 return
 
             device = _best_device()
-            from sam2.build_sam import build_sam2
+            model = self._models.get((model_key, device))
+            built = model is None
+            if built:
+                # The outgoing model stays referenced until the new one is built, so a failed
+                # build leaves the server on it; just hand back cached blocks first.
+                self.empty_cache()
+
+                from sam2.build_sam import build_sam2
+
+                try:
+                    with _mmap_torch_load():
+                        model = build_sam2(cfg["config"], str(ckpt_path), device=device)
+                except RuntimeError as e:
+                    # Legacy (non-zip) checkpoints can't be mmapped; load them the usual way.
+                    if "mmap" not in str(e):
+                        raise
+                    model = build_sam2(cfg["config"], str(ckpt_path), device=device)
+                model.eval()
 
-            self._model = build_sam2(cfg["config"], str(ckpt_path), device=device)
+            # Opt-in reduced precision (the standard SAM2 CUDA recipe): roughly halves
+            # memory traffic through the image encoder and mask decoder.
+            autocast_dtype = None
+            if device == "cuda":
+                import torch
+
+                if _env_flag("SAM2_AUTOCAST", "0"):
+                    autocast_dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+                # Ampere+ tensor cores run the remaining fp32 matmuls/convs as TF32 (as in
+                # SAM2's own demo setup). Process-wide, so set once at load.
+                if torch.cuda.get_device_properties(0).major >= 8 and _env_flag("SAM2_TF32", "1"):
+                    torch.backends.cuda.matmul.allow_tf32 = True
+                    torch.backends.cudnn.allow_tf32 = True
+                # The encoder always sees 1024x1024 inputs, so cuDNN's autotuned conv choice
+                # is picked once and reused for every image.
+                torch.backends.cudnn.benchmark = True
+
+            if not built:
+                pass  # Cached models were already compiled / wrapped when first built.
+            elif _env_flag("SAM2_COMPILE", "0"):
+                self._compile(model, autocast_dtype)  # mode="reduce-overhead" already uses CUDA graphs.
+            elif device == "cuda" and _env_flag("SAM2_CUDA_GRAPHS", "0"):
+                decoder = model.sam_mask_decoder
+                decoder.forward = _DecoderGraphs(decoder.forward)
+
+            # Swap only now: anything above that raises leaves the previous model in place.
+            self._model = model
             self._model_key = model_key
             self._device = device
+            self._autocast_dtype = autocast_dtype
+            with self._info_lock:
+                self._info_cache = self._make_info(model_key, device)
+            self._models.put((model_key, device), model)
+            if built:
+                # Hand back blocks only needed while building / compiling so steady-state
+                # requests start from a compact pool.
+                self.empty_cache()
+
+    def _compile(self, model: Any, autocast_dtype: Any) -> None:
+        # Caller holds self._lock. Same approach as SAM2's own `vos_optimized` path: compile
+        # the forward of the heavy submodules the image predictor calls, not the wrapper.
+        import torch
+
+        if torch.__version__ < "2.5":
+            raise RuntimeError(f"SAM2_COMPILE needs torch>=2.5 (found {torch.__version__})")
+        # Keep Inductor/Triton artifacts next to the weights so a restart reuses them
+        # instead of recompiling from scratch (read lazily, so setting it here is enough).
+        os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", str(_server_dir() / "models" / ".inductor_cache"))
+
+        model.image_encoder.forward = _cloning_outputs(
+            torch.compile(model.image_encoder.forward, mode="reduce-overhead", fullgraph=False, dynamic=False)
+        )
+        # Prompt counts vary per request, so let the decoder graph stay shape-generic.
+        model.sam_mask_decoder.forward = _cloning_outputs(
+            torch.compile(model.sam_mask_decoder.forward, mode="reduce-overhead", fullgraph=False, dynamic=True)
+        )
+
+        # Pay compilation here rather than on the first user request. The encoder runs
+        # twice because its first call fills the position-encoding cache (a guard change),
+        # and the decoder is specialized on multimask_output.
+        from sam2.sam2_image_predictor import SAM2ImagePredictor
+
+        predictor = SAM2ImagePredictor(model)
+        image = np.random.randint(0, 256, size=(512, 512, 3), dtype=np.uint8)
+        with _inference_context(autocast_dtype):
+            for multimask in (False, True):
+                predictor.set_image(image)
+                predictor.predict(
+                    point_coords=np.array([[256.0, 256.0]], dtype=np.float32),
+                    point_labels=np.array([1], dtype=np.int32),
+                    multimask_output=multimask,
+                )
+
+    def inference_context(self) -> ContextManager[Any]:
+        """Context to run the predictor in: no autograd, plus autocast when enabled."""
+        return _inference_context(self._autocast_dtype)
+
+    def synchronize(self) -> None:
+        """Wait for queued CUDA work (no-op on other devices)."""
+        if self._device == "cuda":
+            import torch
+
+            torch.cuda.synchronize()
+
+    def empty_cache(self) -> None:
+        """Return unused cached CUDA blocks to the driver (no-op on other devices)."""
+        if self._device == "cuda" or (self._device is None and _best_device() == "cuda"):
+            import torch
+
+            torch.cuda.empty_cache()
+            torch.cuda.ipc_collect()
 
     def predictor(self):
         # Ensure model loaded.
@@ -164,44 +554,248 @@ class ModelManager:
             return SAM2ImagePredictor(self._model)
 
 
+@contextlib.contextmanager
+def _inference_context(autocast_dtype: Any) -> Iterator[None]:
+    import torch
+
+    with torch.inference_mode():
+        if autocast_dtype is None:
+            yield
+        else:
+            with torch.autocast(device_type="cuda", dtype=autocast_dtype):
+                yield
+
+
+class _LRUCache:
+    """Small thread-safe LRU map; ``capacity <= 0`` disables it."""
+
+    def __init__(self, capacity: int) -> None:
+        self._capacity = capacity
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Any, Any]" = OrderedDict()
+
+    def get(self, key: Any) -> Any:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: Any, value: Any) -> None:
+        if self._capacity <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self._capacity:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class _SessionLock:
+    """Reader/writer lock for a session's predictor.
+
+    set_image replaces the predictor's features and takes it exclusively; predict only
+    reads them, so up to ``max_readers`` predicts may run at once. Waiting writers block
+    new readers so an image upload isn't starved by a stream of clicks.
+    """
+
+    def __init__(self, max_readers: int) -> None:
+        self._cond = threading.Condition(threading.Lock())
+        self._max_readers = max(1, max_readers)
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    def try_acquire_shared(self) -> bool:
+        """Take a shared slot if one is free right now; never blocks."""
+        with self._cond:
+            if self._writer or self._writers_waiting or self._readers >= self._max_readers:
+                return False
+            self._readers += 1
+            return True
+
+    def release_shared(self) -> None:
+        with self._cond:
+            self._readers -= 1
+            self._cond.notify_all()
+
+    def acquire_exclusive(self, blocking: bool = True) -> bool:
+        with self._cond:
+            if not blocking:
+                if self._writer or self._readers:
+                    return False
+                self._writer = True
+                return True
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+            return True
+
+    def release_exclusive(self) -> None:
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def exclusive(self) -> Iterator[None]:
+        self.acquire_exclusive()
+        try:
+            yield
+        finally:
+            self.release_exclusive()
+
+
+@dataclass
+class _PendingPrompt:
+    # A validated prompt waiting to be run, possibly batched with others on the same session.
+    points: Optional[np.ndarray]
+    labels: Optional[np.ndarray]
+    box: Optional[np.ndarray]
+    multimask: bool
+    # Resolves to (best-scoring (H, W) bool mask, score, elapsed_ms).
+    future: "Future[Tuple[np.ndarray, float, float]]" = field(default_factory=Future)
+    image_hash: Optional[bytes] = None
+
+    def batch_key(self) -> Tuple[Optional[int], bool, bool]:
+        # Prompts can only be stacked into one (B, K, 2) call if their shapes agree.
+        n_points = None if self.points is None else int(self.points.shape[0])
+        return (n_points, self.box is not None, self.multimask)
+
+
 @dataclass
 class _Session:
     session_id: str
     predictor: Any
-    lock: threading.Lock
+    lock: _SessionLock
     last_used: float
     width: int = 0
     height: int = 0
+    model_key: str = ""
+    image_hash: Optional[bytes] = None
+    pending: List[_PendingPrompt] = field(default_factory=list)
+    pending_lock: threading.Lock = field(default_factory=threading.Lock)
+    runners: int = 0  # _drain jobs submitted for this session (guarded by pending_lock).
+    # Set (under SessionManager._lock) once the session is deleted/expired. Requests that
+    # looked the session up earlier re-check it after taking ``lock``, so they never touch
+    # a predictor that has since been recycled into another session.
+    retired: bool = False
+
+
+class _SessionPool:
+    """Recycles deleted/expired session shells so new sessions skip building a predictor."""
+
+    def __init__(self, capacity: int) -> None:
+        self._shells: "queue.LifoQueue[_Session]" = queue.LifoQueue(maxsize=max(0, capacity))
+        self._enabled = capacity > 0
+
+    def acquire(self, model_key: str) -> Optional[_Session]:
+        while True:
+            try:
+                s = self._shells.get_nowait()
+            except queue.Empty:
+                return None
+            if s.model_key == model_key:
+                return s
+            # Predictor is bound to a previous model; drop it.
+
+    def release(self, s: _Session) -> None:
+        if not self._enabled:
+            return
+        # Only recycle idle shells: a request still holding the session (or queued on it)
+        # must not see its predictor reset underneath it. The session is already retired,
+        # so nothing new can be queued once pending is empty.
+        with s.pending_lock:
+            if s.pending or s.runners:
+                return
+        if not s.lock.acquire_exclusive(blocking=False):
+            return
+        try:
+            s.predictor.reset_predictor()
+            s.width = s.height = 0
+            s.image_hash = None
+        finally:
+            s.lock.release_exclusive()
+        try:
+            self._shells.put_nowait(s)
+        except queue.Full:
+            pass
+
+    def clear(self) -> None:
+        while True:
+            try:
+                self._shells.get_nowait()
+            except queue.Empty:
+                return
 
 
 class SessionManager:
-    def __init__(self, model_mgr: ModelManager) -> None:
+    def __init__(self, model_mgr: ModelManager, executor: Optional[Executor] = None) -> None:
         self._model_mgr = model_mgr
+        # Runs batched decoder calls and mask encoding for the async predict methods.
+        self._executor = executor or ThreadPoolExecutor(max_workers=2, thread_name_prefix="sam2-infer")
         self._lock = threading.Lock()
         self._sessions: Dict[str, _Session] = {}
         self._ttl_s = int(os.environ.get("SAM2_SESSION_TTL_S", "1800"))  # 30 min
         self._max_sessions = int(os.environ.get("SAM2_MAX_SESSIONS", "8"))
+        # Micro-batching of concurrent prompts against the same session's image.
+        self._max_batch = max(1, int(os.environ.get("SAM2_MAX_BATCH", "8")))
+        # Concurrent predicts per session (they only read the image features). Compiled
+        # models use CUDA graphs, which must not be replayed concurrently.
+        self._session_concurrency = int(os.environ.get("SAM2_SESSION_CONCURRENCY", "1"))
+        if _env_flag("SAM2_COMPILE", "0"):
+            self._session_concurrency = 1
+        self._batch_window_s = max(0.0, float(os.environ.get("SAM2_BATCH_WINDOW_MS", "5"))) / 1000.0
+        # (model, image content, prompt) -> (score, mask_area, encoded mask fields)
+        self._pred_cache = _LRUCache(int(os.environ.get("SAM2_PRED_CACHE", "256")))
+        # (model, image content) -> (predictor features, orig_hw, width, height)
+        self._emb_cache = _LRUCache(int(os.environ.get("SAM2_EMB_CACHE", "8")))
+        self._pool = _SessionPool(int(os.environ.get("SAM2_SESSION_POOL", str(self._max_sessions))))
+
+    def _retire(self, session_id: str) -> _Session:
+        # Caller holds self._lock.
+        s = self._sessions.pop(session_id)
+        s.retired = True
+        return s
 
     def _gc(self) -> None:
         now = time.time()
         expired = [sid for sid, s in self._sessions.items() if now - s.last_used > self._ttl_s]
         for sid in expired:
-            self._sessions.pop(sid, None)
+            self._pool.release(self._retire(sid))
 
         # Enforce max sessions (LRU-ish).
         if len(self._sessions) > self._max_sessions:
             by_old = sorted(self._sessions.values(), key=lambda s: s.last_used)
             for s in by_old[: max(0, len(self._sessions) - self._max_sessions)]:
-                self._sessions.pop(s.session_id, None)
+                self._pool.release(self._retire(s.session_id))
 
     def clear(self) -> None:
         with self._lock:
-            self._sessions.clear()
+            for sid in list(self._sessions):
+                self._retire(sid)
+        self._pool.clear()
+        self._pred_cache.clear()
+        self._emb_cache.clear()
+        # Predictors and cached embeddings were the last references to a replaced model.
+        self._model_mgr.empty_cache()
 
     def count(self) -> int:
+        # Lock-free and without GC: /health only needs an approximate number, and may
+        # include sessions that expire on the next create/get.
+        return len(self._sessions)
+
+    def exists(self, session_id: str) -> bool:
         with self._lock:
             self._gc()
-            return len(self._sessions)
+            return session_id in self._sessions
 
     def create(self) -> str:
         with self._lock:
@@ -210,18 +804,33 @@ class SessionManager:
                 # After GC, still full.
                 raise RuntimeError("too many sessions")
             sid = uuid.uuid4().hex
-            predictor = self._model_mgr.predictor()
-            self._sessions[sid] = _Session(
-                session_id=sid,
-                predictor=predictor,
-                lock=threading.Lock(),
-                last_used=time.time(),
-            )
+            model_key = self._model_mgr.info().model_key
+            shell = self._pool.acquire(model_key)
+            if shell is not None:
+                # Fresh session object around the recycled predictor and its lock: the old
+                # object stays retired for any request that still holds it.
+                s = _Session(
+                    session_id=sid,
+                    predictor=shell.predictor,
+                    lock=shell.lock,
+                    last_used=time.time(),
+                    model_key=model_key,
+                )
+            else:
+                s = _Session(
+                    session_id=sid,
+                    predictor=self._model_mgr.predictor(),
+                    lock=_SessionLock(self._session_concurrency),
+                    last_used=time.time(),
+                    model_key=model_key,
+                )
+            self._sessions[sid] = s
             return sid
 
     def delete(self, session_id: str) -> None:
         with self._lock:
-            self._sessions.pop(session_id)
+            s = self._retire(session_id)
+        self._pool.release(s)
 
     def _get(self, session_id: str) -> _Session:
         with self._lock:
@@ -232,74 +841,267 @@ class SessionManager:
             s.last_used = time.time()
             return s
 
-    def set_image(self, session_id: str, image_bytes: bytes) -> SessionImageResponse:
-        s = self._get(session_id)
-        t0 = time.time()
-        img = Image.open(BytesIO(image_bytes)).convert("RGB")
-        arr = np.asarray(img, dtype=np.uint8)
-        with s.lock:
-            s.predictor.set_image(arr)
-            s.width, s.height = img.width, img.height
-        dt = (time.time() - t0) * 1000.0
-        return SessionImageResponse(session_id=session_id, width=img.width, height=img.height, elapsed_ms=dt)
-
-    def predict(self, session_id: str, req: PredictRequest) -> PredictResponse:
+    @contextlib.contextmanager
+    def _exclusive(self, s: _Session) -> Iterator[None]:
+        try:
+            with s.lock.exclusive():
+                yield
+        finally:
+            # Prompts queued meanwhile found the predictor busy and were left for us to start.
+            self._schedule(s)
+
+    def set_image(self, session_id: str, image: Union[bytes, BinaryIO]) -> SessionImageResponse:
+        """Embed an image given as bytes or a seekable binary stream (e.g. a spooled upload)."""
         s = self._get(session_id)
-        if req.points is None and req.box is None:
+        t0 = time.perf_counter_ns()
+        stream = BytesIO(image) if isinstance(image, (bytes, bytearray)) else image
+        image_hash, size = _hash_stream(stream)
+        if size == 0:
+            raise ValueError("empty upload")
+        emb_key = (self._model_mgr.info().model_key, image_hash)
+
+        # Same image already embedded (by this or another session): reuse the encoder
+        # output instead of re-running the image encoder.
+        cached = self._emb_cache.get(emb_key)
+        if cached is not None:
+            features, orig_hw, width, height = cached
+            with self._exclusive(s):
+                if s.retired:
+                    raise KeyError(session_id)
+                s.predictor.reset_predictor()
+                s.predictor._features = features
+                s.predictor._orig_hw = list(orig_hw)
+                s.predictor._is_image_set = True
+                s.width, s.height = width, height
+                s.image_hash = image_hash
+        else:
+            arr = _decode_rgb(stream, size)
+            height, width = arr.shape[:2]
+            with self._exclusive(s), self._model_mgr.inference_context():
+                if s.retired:
+                    raise KeyError(session_id)
+                s.predictor.set_image(arr)
+                # Encoder kernels are queued asynchronously; wait so elapsed_ms is real.
+                self._model_mgr.synchronize()
+                s.width, s.height = width, height
+                s.image_hash = image_hash
+                # Features are never mutated in place, so sharing them by reference is safe.
+                self._emb_cache.put(
+                    emb_key, (s.predictor._features, list(s.predictor._orig_hw), width, height)
+                )
+        dt = (time.perf_counter_ns() - t0) / 1e6
+        return SessionImageResponse(session_id=session_id, width=width, height=height, elapsed_ms=dt)
+
+    @staticmethod
+    def _make_prompt(
+        points: Optional[np.ndarray], labels: Optional[np.ndarray], box: Optional[np.ndarray], multimask: bool
+    ) -> _PendingPrompt:
+        if points is None and box is None:
             raise ValueError("Either points or box must be provided.")
-        if req.points is not None:
-            if req.labels is None or len(req.labels) != len(req.points):
+        if points is not None:
+            if points.ndim != 2 or points.shape[1] != 2:
+                raise ValueError("points must be a list of [x, y] pairs.")
+            if labels is None or labels.shape != (points.shape[0],):
                 raise ValueError("labels must be provided and have the same length as points.")
-            pts = np.asarray(req.points, dtype=np.float32)
-            lbs = np.asarray(req.labels, dtype=np.int32)
         else:
-            pts = None
-            lbs = None
+            labels = None
+        if box is not None and box.shape != (4,):
+            raise ValueError("box must be [x0, y0, x1, y1].")
+        return _PendingPrompt(points=points, labels=labels, box=box, multimask=bool(multimask))
 
-        box = np.asarray(req.box, dtype=np.float32) if req.box is not None else None
+    def _prompt_from_request(self, req: PredictRequest) -> _PendingPrompt:
+        if req.points_b64 is not None:
+            pts = _b64_array(req.points_b64, np.float32, "points_b64")
+            if pts.size % 2:
+                raise ValueError("points_b64 must hold (x, y) float32 pairs.")
+            pts = pts.reshape(-1, 2)
+        else:
+            pts = None if req.points is None else np.asarray(req.points, dtype=np.float32)
+        if req.labels_b64 is not None:
+            lbs = _b64_array(req.labels_b64, np.int32, "labels_b64")
+        else:
+            lbs = None if req.labels is None else np.asarray(req.labels, dtype=np.int32)
+        if req.box_b64 is not None:
+            box = _b64_array(req.box_b64, np.float32, "box_b64")
+        else:
+            box = None if req.box is None else np.asarray(req.box, dtype=np.float32)
+        return self._make_prompt(pts, lbs, box, req.multimask)
 
-        t0 = time.time()
-        with s.lock:
+    def _schedule(self, s: _Session) -> None:
+        """Submit _drain jobs for queued prompts, up to the session's concurrency."""
+        with s.pending_lock:
+            n = min(len(s.pending), self._session_concurrency) - s.runners
+            if n <= 0:
+                return
+            s.runners += n
+        for _ in range(n):
+            self._executor.submit(self._drain, s)
+
+    def _drain(self, s: _Session) -> None:
+        # Executor job: run the session's queued prompts batch by batch. It never waits for
+        # the predictor, so a set_image in progress can't pin inference threads; if the
+        # lock is taken (or wanted) by set_image, exit and let its release reschedule.
+        while True:
+            with s.pending_lock:
+                if not s.pending or not s.lock.try_acquire_shared():
+                    s.runners -= 1
+                    return
+                # Only wait for stragglers when there is already concurrent traffic on this
+                # session; a lone interactive click shouldn't pay the batching window.
+                busy = 1 < len(s.pending) < self._max_batch
             try:
-                masks, scores, _low_res = s.predictor.predict(
-                    point_coords=pts,
-                    point_labels=lbs,
-                    box=box,
-                    multimask_output=bool(req.multimask),
-                )
-            except RuntimeError as e:
-                # Most common: predict called before set_image.
-                raise ValueError(str(e)) from e
-        dt = (time.time() - t0) * 1000.0
-
-        if masks is None or len(masks) == 0:
-            raise ValueError("model returned no masks")
-
-        scores_np = np.asarray(scores, dtype=np.float32)
-        best = int(np.argmax(scores_np))
-        best_mask = masks[best]
-        if best_mask.ndim == 3 and best_mask.shape[0] == 1:
-            best_mask = best_mask[0]
-
-        mask_area = int(np.sum(best_mask > 0))
-
-        # PNG encode mask as an RGBA alpha mask:
-        # - RGB is white
-        # - Alpha is 0/255 for background/foreground
-        # This makes client-side compositing easy (dstIn).
-        m8 = (best_mask.astype(np.uint8) * 255) if best_mask.dtype != np.uint8 else best_mask
-        out = BytesIO()
-        alpha = Image.fromarray(m8, mode="L")
-        rgba = Image.new("RGBA", alpha.size, (255, 255, 255, 0))
-        rgba.putalpha(alpha)
-        rgba.save(out, format="PNG")
-        b64 = base64.b64encode(out.getvalue()).decode("ascii")
+                if busy and self._batch_window_s > 0:
+                    time.sleep(self._batch_window_s)
+                self._run_batch(s, self._take_batch(s))
+            finally:
+                s.lock.release_shared()
+
+    def _take_batch(self, s: _Session) -> List[_PendingPrompt]:
+        # The oldest queued prompt plus compatible ones behind it, up to SAM2_MAX_BATCH.
+        with s.pending_lock:
+            if not s.pending:
+                return []  # A concurrent runner took them during the batching window.
+            key = s.pending[0].batch_key()
+            batch = [p for p in s.pending if p.batch_key() == key][: self._max_batch]
+            taken = {id(p) for p in batch}
+            s.pending = [p for p in s.pending if id(p) not in taken]
+        # Requests whose client went away were cancelled; don't run the decoder for them.
+        return [p for p in batch if p.future.set_running_or_notify_cancel()]
+
+    def _run_batch(self, s: _Session, batch: List[_PendingPrompt]) -> None:
+        # Caller holds s.lock (shared).
+        if not batch:
+            return
+        for p in batch:
+            p.image_hash = s.image_hash
+        t0 = time.perf_counter_ns()
+        try:
+            if s.retired:
+                # Deleted while queued; the predictor may already serve another session.
+                raise KeyError(s.session_id)
+            with self._model_mgr.inference_context():
+                # predict() copies the masks to host numpy, which already waits for the GPU.
+                results = self._predict_batch(s.predictor, batch)
+        except RuntimeError as e:
+            # Most common: predict called before set_image.
+            for p in batch:
+                p.future.set_exception(ValueError(str(e)))
+        except Exception as e:
+            for p in batch:
+                p.future.set_exception(e)
+        else:
+            dt = (time.perf_counter_ns() - t0) / 1e6
+            for p, (m, sc) in zip(batch, results):
+                p.future.set_result((m, sc, dt))
+
+    @staticmethod
+    def _predict_batch(predictor: Any, batch: List[_PendingPrompt]) -> List[Tuple[np.ndarray, float]]:
+        """Best (mask, score) per prompt.
+
+        Same steps as SAM2ImagePredictor.predict, minus its host copy of every candidate
+        as float32: the argmax over candidates happens on the device, and only the chosen
+        bool mask per prompt is transferred (1/12 of the bytes with multimask=True).
+        """
+        import torch
+
+        head = batch[0]
+        if not predictor._is_image_set:
+            raise RuntimeError("An image must be set with .set_image(...) before mask prediction.")
+        if len(batch) == 1:
+            points, labels, box = head.points, head.labels, head.box
+        else:
+            # SAM2ImagePredictor accepts (B, K, 2) points / (B, 4) boxes and returns
+            # (B, C, H, W) masks with (B, C) scores.
+            points = None if head.points is None else np.stack([p.points for p in batch])
+            labels = None if head.labels is None else np.stack([p.labels for p in batch])
+            box = None if head.box is None else np.stack([p.box for p in batch])
+        _mask_input, coords, labels_t, box_t = predictor._prep_prompts(points, labels, box, None, True)
+        masks, scores, _low_res = predictor._predict(coords, labels_t, box_t, None, head.multimask)
+        best = scores.argmax(dim=1)
+        rows = torch.arange(masks.shape[0], device=masks.device)
+        best_masks = masks[rows, best].cpu().numpy()
+        best_scores = scores[rows, best].float().cpu().numpy()
+        return [(m, float(sc)) for m, sc in zip(best_masks, best_scores)]
+
+    def _cache_key(self, image_hash: Optional[bytes], item: _PendingPrompt, fmt: str) -> Optional[Tuple[Any, ...]]:
+        if image_hash is None:
+            return None
+        # Keyed on the parsed float32/int32 arrays, so list and base64 prompts share entries.
+        return (
+            self._model_mgr.info().model_key,
+            image_hash,
+            None if item.points is None else item.points.tobytes(),
+            None if item.labels is None else item.labels.tobytes(),
+            None if item.box is None else item.box.tobytes(),
+            item.multimask,
+            fmt,
+        )
+
+    async def _predict_encoded(
+        self, session_id: str, item: _PendingPrompt, fmt: str, encode: Callable[[np.ndarray], Any]
+    ) -> Tuple[float, int, Any, float]:
+        """Run a prompt and encode the best mask; returns (score, mask_area, encoded, elapsed_ms)."""
+        s = self._get(session_id)
 
+        # Undo/redo and retries re-send identical prompts; skip the decoder for those.
+        cached = self._pred_cache.get(self._cache_key(s.image_hash, item, fmt))
+        if cached is not None:
+            score, mask_area, encoded = cached
+            return score, mask_area, encoded, 0.0
+
+        # Queue on the event loop, not from an executor thread: concurrent requests pile up
+        # here while a batch runs, and the next _drain pass takes them all in one call.
+        with s.pending_lock:
+            if s.retired:
+                raise KeyError(session_id)
+            s.pending.append(item)
+        self._schedule(s)
+        best_mask, score, dt = await asyncio.wrap_future(item.future)
+
+        def finish() -> Tuple[int, Any]:
+            # count_nonzero avoids materializing a full boolean temp.
+            return int(np.count_nonzero(best_mask)), encode(best_mask)
+
+        mask_area, encoded = await asyncio.get_running_loop().run_in_executor(self._executor, finish)
+
+        key = self._cache_key(item.image_hash, item, fmt)
+        if key is not None:
+            self._pred_cache.put(key, (score, mask_area, encoded))
+        return score, mask_area, encoded, dt
+
+    async def predict(self, session_id: str, req: PredictRequest) -> PredictResponse:
+        if req.return_format == "rle":
+            fmt, encode = "rle", lambda m: {"mask_rle": _encode_mask_rle(m)}
+        else:
+            fmt, encode = "png_base64", lambda m: {
+                "mask_png_base64": base64.b64encode(_encode_mask_png(m)).decode("ascii")
+            }
+        item = self._prompt_from_request(req)
+        score, mask_area, payload, dt = await self._predict_encoded(session_id, item, fmt, encode)
         return PredictResponse(
             model=self._model_mgr.info(),
             session_id=session_id,
-            score=float(scores_np[best]),
+            score=score,
             mask_area=mask_area,
-            mask_png_base64=b64,
             elapsed_ms=dt,
+            **payload,
         )
+
+    async def predict_png(self, session_id: str, req: PredictRequest) -> Tuple[bytes, float, int, float]:
+        """Like predict, but returns the raw RGBA mask PNG: (png, score, mask_area, elapsed_ms)."""
+        item = self._prompt_from_request(req)
+        score, mask_area, png, dt = await self._predict_encoded(session_id, item, "png", _encode_mask_png)
+        return png, score, mask_area, dt
+
+    async def predict_png_arrays(
+        self,
+        session_id: str,
+        points: Optional[np.ndarray],
+        labels: Optional[np.ndarray],
+        box: Optional[np.ndarray],
+        multimask: bool,
+    ) -> Tuple[bytes, float, int, float]:
+        """predict_png for prompts already parsed into float32 (K, 2) / int32 (K,) / float32 (4,) arrays."""
+        item = self._make_prompt(points, labels, box, multimask)
+        score, mask_area, png, dt = await self._predict_encoded(session_id, item, "png", _encode_mask_png)
+        return png, score, mask_area, dt